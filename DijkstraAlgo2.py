@@ -1,5 +1,14 @@
 from manim import *
 import numpy as np
+import json
+import os
+import sys
+import tracemalloc
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
 
 # Configure the frame size (optional, can be adjusted as needed)
 config.frame_height = 16
@@ -7,8 +16,258 @@ config.frame_width = 9
 config.pixel_width = 1080
 config.pixel_height = 1920
 
+
+def reset_peak_rss():
+    # Reset the kernel's peak RSS (VmHWM) to the current RSS. Linux only;
+    # returns False where /proc/self/clear_refs is missing or not writable.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def read_rss():
+    # Current and peak RSS in MiB from /proc/self/status, or None off Linux
+    rss = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    rss[key] = int(value.split()[0]) / 1024
+    except OSError:
+        return None
+    if len(rss) != 2:
+        return None
+    return rss["VmRSS"], rss["VmHWM"]
+
+
+def dijkstra_trace(vertices, edges_with_weights, distances, end_vertex):
+    # Yield the steps of Dijkstra's algorithm one at a time so the scene can
+    # render them as they come instead of building the whole trace up front.
+    # `distances` is updated in place.
+    #   ("visit", vertex)            vertex picked as the next closest one
+    #   ("relax", vertex, neighbor)  distance to neighbor improved through vertex
+    #   ("settle", vertex)           vertex is done
+    unvisited = set(vertices)
+    while unvisited:
+        # Find the unvisited node with the smallest distance
+        current_vertex = min(unvisited, key=lambda vertex: distances[vertex])
+        if distances[current_vertex] == float('inf'):
+            return
+        unvisited.remove(current_vertex)
+        yield ("visit", current_vertex)
+
+        # For all neighbors of the current vertex
+        for u, v, weight in edges_with_weights:
+            if u == current_vertex and v in unvisited:
+                neighbor = v
+            elif v == current_vertex and u in unvisited:
+                neighbor = u
+            else:
+                continue
+
+            new_distance = distances[current_vertex] + weight
+            if new_distance < distances[neighbor]:
+                distances[neighbor] = new_distance
+                yield ("relax", current_vertex, neighbor)
+
+        yield ("settle", current_vertex)
+
+        # Stop if we reached the end vertex
+        if current_vertex == end_vertex:
+            return
+
+
+class RawFrameSink:
+    # Writes raw RGBA frames into a memory-mapped file and an index of phase
+    # boundaries next to it (<path>.json). Post-processing tools can read the
+    # frames without decoding an MP4 again, see load_raw_frames.
+    # A render that produces no frames (e.g. -s) leaves an empty file with
+    # frame_count 0, which np.memmap refuses to map.
+    # The file is preallocated in chunks, so only the first frame_count frames
+    # in the index are real. The index is rewritten at every phase boundary,
+    # which keeps it usable if a render is interrupted.
+    # The path does not depend on the quality settings: rendering the scene at
+    # another quality overwrites the same file.
+    def __init__(self, path, width, height, frame_rate, chunk_frames=60):
+        self.path = path
+        self.index_path = path + ".json"
+        self.frame_shape = (height, width, 4)
+        self.frame_bytes = height * width * 4
+        self.frame_rate = frame_rate
+        self.chunk_frames = chunk_frames  # The file grows by this many frames at a time
+        self.frame_count = 0
+        self.capacity = 0
+        self.frames = None
+        self.phases = []
+        open(path, "wb").close()
+        self.write_index()
+
+    def write_frame(self, frame, num_frames=1):
+        # The OpenGL renderer passes itself instead of the frame
+        if not isinstance(frame, np.ndarray):
+            frame = frame.get_frame()
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Expected a frame of shape {self.frame_shape}, got {frame.shape}")
+        for _ in range(num_frames):
+            if self.frame_count == self.capacity:
+                self.grow()
+            self.frames[self.frame_count] = frame
+            self.frame_count += 1
+
+    def grow(self):
+        # Unmap before resizing the file, then map it again with room for more frames
+        if self.frames is not None:
+            self.frames.flush()
+            self.frames = None
+        self.capacity += self.chunk_frames
+        os.truncate(self.path, self.capacity * self.frame_bytes)
+        self.frames = np.memmap(
+            self.path, dtype=np.uint8, mode="r+", shape=(self.capacity, *self.frame_shape)
+        )
+
+    def begin_phase(self, name):
+        if self.phases:
+            self.phases[-1]["end"] = self.frame_count
+        if name is not None:
+            self.phases.append({"name": name, "start": self.frame_count, "end": None})
+        if self.frames is not None:
+            self.frames.flush()
+        self.write_index()
+
+    def close(self):
+        self.begin_phase(None)
+        self.frames = None
+        # Cut off the unused part of the last chunk
+        os.truncate(self.path, self.frame_count * self.frame_bytes)
+
+    def write_index(self):
+        index = {
+            "width": self.frame_shape[1],
+            "height": self.frame_shape[0],
+            "channels": 4,
+            "dtype": "uint8",
+            "frame_rate": self.frame_rate,
+            "frame_count": self.frame_count,
+            "phases": self.phases,
+        }
+        # Write to a temporary file and rename it so readers never see half an index
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(temp_path, self.index_path)
+
+
+def load_raw_frames(path):
+    # Map the frames written by RawFrameSink without copying them. Returns the
+    # index and an array of shape (frame_count, height, width, 4).
+    with open(path + ".json") as f:
+        index = json.load(f)
+    shape = (index["frame_count"], index["height"], index["width"], index["channels"])
+    if index["frame_count"] == 0:
+        return index, np.empty(shape, dtype=index["dtype"])
+    return index, np.memmap(path, dtype=index["dtype"], mode="r", shape=shape)
+
+
 class DijkstraAnimation(Scene):
+    # Streaming mode is meant for very long traces. Each relaxation only
+    # animates the distance cell that changed (so the video is shorter than the
+    # default one), the copy that edge.animate leaves in edge.target is dropped
+    # once the edge is reset, and memory is logged at the end of each phase and
+    # every memory_report_interval relaxations. Memory is traced with
+    # tracemalloc, which slows the render down and adds its own overhead.
+    streaming = False
+    memory_report_interval = 100
+    started_tracing = False
+    rss_peak_reset = False
+    # Write raw RGBA frames to media_dir/raw_frames/<Scene>.rgba instead of
+    # encoding a movie, see RawFrameSink. Works with both renderers.
+    raw_frames = False
+    raw_frame_sink = None
+
+    def render(self, preview=False):
+        try:
+            return super().render(preview)
+        finally:
+            # tear_down is skipped when construct raises
+            self.stop_memory_tracing()
+            self.close_raw_frame_sink()
+
+    def setup(self):
+        self.current_phase = None
+        # Leave tracing alone if it was already on (e.g. PYTHONTRACEMALLOC)
+        if self.streaming and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+        if self.raw_frames:
+            raw_dir = os.path.join(config.media_dir, "raw_frames")
+            os.makedirs(raw_dir, exist_ok=True)
+            self.raw_frame_sink = RawFrameSink(
+                os.path.join(raw_dir, f"{type(self).__name__}.rgba"),
+                config.pixel_width,
+                config.pixel_height,
+                config.frame_rate,
+            )
+            # Send every rendered frame to the sink and skip the movie encoding.
+            # config is global, so write_to_movie is restored when the sink closes.
+            self.previous_write_to_movie = config.write_to_movie
+            config.write_to_movie = False
+            self.renderer.file_writer.write_frame = self.raw_frame_sink.write_frame
+
+    def tear_down(self):
+        self.begin_phase(None)
+        self.stop_memory_tracing()
+        self.close_raw_frame_sink()
+
+    def close_raw_frame_sink(self):
+        if self.raw_frame_sink is not None:
+            self.raw_frame_sink.close()
+            logger.info(f"Wrote {self.raw_frame_sink.frame_count} raw frames to {self.raw_frame_sink.path}")
+            self.raw_frame_sink = None
+            config.write_to_movie = self.previous_write_to_movie
+
+    def stop_memory_tracing(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def log_memory(self, label):
+        # Peaks are measured since the start of the current phase
+        current, peak = tracemalloc.get_traced_memory()
+        tracer = tracemalloc.get_tracemalloc_memory()
+        message = (
+            f"{label}: traced memory {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB"
+            f" (tracer overhead {tracer / 2**20:.1f} MiB)"
+        )
+        rss = read_rss() if self.rss_peak_reset else None
+        if rss is not None:
+            message += f", RSS {rss[0]:.1f} MiB, phase peak RSS {rss[1]:.1f} MiB"
+        elif resource is not None:
+            # ru_maxrss is in bytes on macOS and in KiB elsewhere. It is the
+            # peak of the whole process so far, not of this phase.
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            max_rss /= 2**20 if sys.platform == "darwin" else 2**10
+            message += f", process lifetime peak RSS {max_rss:.1f} MiB"
+        logger.info(message)
+
+    def begin_phase(self, name):
+        # Close the running phase (reporting its memory) and start a new one
+        if self.streaming and self.current_phase is not None:
+            self.log_memory(f"Phase '{self.current_phase}'")
+        self.current_phase = name
+        if self.streaming and name is not None:
+            tracemalloc.reset_peak()
+            self.rss_peak_reset = reset_peak_rss()
+        if self.raw_frame_sink is not None:
+            self.raw_frame_sink.begin_phase(name)
+
     def construct(self):
+        self.begin_phase("setup")
+
         # Define the graph vertices and edges with weights
         vertices = ["A", "B", "C", "D", "E", "F"]
         edges_with_weights = [
@@ -178,7 +437,6 @@ class DijkstraAnimation(Scene):
         # Initialize distances
         distances = {v: float('inf') for v in vertices}
         distances[start_vertex] = 0
-        unvisited = set(vertices)
 
         # Create an array to display distances
         array_mobject = self.create_distance_array(vertices, distances)
@@ -197,56 +455,51 @@ class DijkstraAnimation(Scene):
         self.wait(1)
 
         # Dijkstra's algorithm visualization
-        while unvisited:
-            # Find the unvisited node with the smallest distance
-            current_vertex = min(unvisited, key=lambda vertex: distances[vertex])
-            if distances[current_vertex] == float('inf'):
-                break
-            unvisited.remove(current_vertex)
-
-            # Highlight current vertex
-            node_groups[current_vertex].submobjects[0].set_fill(color=YELLOW, opacity=1)
-            self.wait(0.5)
-
-            # For all neighbors of the current vertex
-            for u, v, weight in edges_with_weights:
-                if u == current_vertex and v in unvisited:
-                    neighbor = v
-                elif v == current_vertex and u in unvisited:
-                    neighbor = u
+        self.begin_phase("search")
+        relaxations = 0
+        for step in dijkstra_trace(vertices, edges_with_weights, distances, end_vertex):
+            if step[0] == "visit":
+                # Highlight current vertex
+                node_groups[step[1]].submobjects[0].set_fill(color=YELLOW, opacity=1)
+                self.wait(0.5)
+
+            elif step[0] == "relax":
+                current_vertex, neighbor = step[1], step[2]
+
+                # Highlight the edge and update distance
+                edge_to_highlight = (current_vertex, neighbor) if (current_vertex, neighbor) in edge_dict else (neighbor, current_vertex)
+                edge = edge_dict[edge_to_highlight]
+                self.play(
+                    edge.animate.set_color(ORANGE),
+                    run_time=1,
+                    rate_func=smooth
+                )
+                self.wait(0.5)
+
+                # Update the array
+                if self.streaming:
+                    self.update_distance_cell(array_mobject, vertices.index(neighbor), distances[neighbor])
                 else:
-                    continue
-
-                new_distance = distances[current_vertex] + weight
-                if new_distance < distances[neighbor]:
-                    distances[neighbor] = new_distance
-
-                    # Highlight the edge and update distance
-                    edge_to_highlight = (current_vertex, neighbor) if (current_vertex, neighbor) in edge_dict else (neighbor, current_vertex)
-                    edge = edge_dict[edge_to_highlight]
-                    self.play(
-                        edge.animate.set_color(ORANGE),
-                        run_time=1,
-                        rate_func=smooth
-                    )
-                    self.wait(0.5)
-
-                    # Update the array
                     self.update_distance_array(array_mobject, vertices, distances)
-                    self.wait(0.5)
+                self.wait(0.5)
 
-                    # Reset edge color
-                    self.play(edge.animate.set_color(GRAY), run_time=0.5)
+                # Reset edge color
+                self.play(edge.animate.set_color(GRAY), run_time=0.5)
 
-            # Mark current vertex as visited
-            node_groups[current_vertex].submobjects[0].set_fill(color=GREEN, opacity=1)
-            self.wait(0.5)
+                if self.streaming:
+                    # edge.animate keeps a full copy of the edge in edge.target
+                    edge.target = None
+                    relaxations += 1
+                    if relaxations % self.memory_report_interval == 0:
+                        self.log_memory(f"Phase 'search' after {relaxations} relaxations")
 
-            # Stop if we reached the end vertex
-            if current_vertex == end_vertex:
-                break
+            elif step[0] == "settle":
+                # Mark current vertex as visited
+                node_groups[step[1]].submobjects[0].set_fill(color=GREEN, opacity=1)
+                self.wait(0.5)
 
         # Reconstruct and highlight the shortest path
+        self.begin_phase("path")
         path = self.reconstruct_path(start_vertex, end_vertex, distances, edges_with_weights)
         if path:
             # Display "Shortest Path" text on the right
@@ -302,10 +555,13 @@ class DijkstraAnimation(Scene):
 
     def update_distance_array(self, array_mobject, vertices, distances):
         for i, v in enumerate(vertices):
-            distance_value = distances[v] if distances[v] != float('inf') else "∞"
-            distance_text = Text(str(distance_value), font_size=24, color=WHITE).set_z_index(3)
-            distance_text.move_to(array_mobject[i][1][1])
-            self.play(Transform(array_mobject[i][1][1], distance_text), run_time=0.5)
+            self.update_distance_cell(array_mobject, i, distances[v])
+
+    def update_distance_cell(self, array_mobject, index, distance):
+        distance_value = distance if distance != float('inf') else "∞"
+        distance_text = Text(str(distance_value), font_size=24, color=WHITE).set_z_index(3)
+        distance_text.move_to(array_mobject[index][1][1])
+        self.play(Transform(array_mobject[index][1][1], distance_text), run_time=0.5)
 
     def reconstruct_path(self, start_vertex, end_vertex, distances, edges_with_weights):
         # Create a graph representation for traversal
@@ -329,3 +585,11 @@ class DijkstraAnimation(Scene):
                 return None  # No path found
         path.reverse()
         return path
+
+
+class StreamingDijkstraAnimation(DijkstraAnimation):
+    streaming = True
+
+
+class RawFrameDijkstraAnimation(DijkstraAnimation):
+    raw_frames = True